@@ -1,104 +1,112 @@
 """
 Async client for amanogawa.space API.
-Wraps all endpoints, handles pagination, basic in-memory caching.
+Wraps all endpoints, handles pagination, caching via the shared cache backend.
+Responses are trimmed to compact records (see models.py) before caching.
 """
 
-import time
-from typing import Any
+import asyncio
 
 import httpx
 
+import cache
+from models import CatalogPage, EpisodeList, Title, TitleSummary
+
 BASE_URL = "https://amanogawa.space"
 TIMEOUT = 10.0
 
-# Simple TTL cache: {key: (data, expires_at)}
-_cache: dict[str, tuple[Any, float]] = {}
-
 CACHE_TTL_CATALOG = 300  # 5 min
 CACHE_TTL_TITLE = 900  # 15 min
 CACHE_TTL_EPISODES = 900  # 15 min
+CRAWL_CONCURRENCY = 4  # parallel page requests when crawling the whole catalog
 
 
-def _cache_get(key: str) -> Any | None:
-    entry = _cache.get(key)
-    if entry is None:
-        return None
-    data, expires_at = entry
-    if time.time() > expires_at:
-        del _cache[key]
-        return None
-    return data
-
-
-def _cache_set(key: str, data: Any, ttl: float) -> None:
-    _cache[key] = (data, time.time() + ttl)
-
+async def get_catalog(page: int = 1) -> CatalogPage:
+    """Fetch paginated catalog page (page count + title summaries)."""
+    return await cache.get_backend().get_or_fetch(
+        f"catalog:{page}",
+        CACHE_TTL_CATALOG,
+        lambda: _fetch_catalog(page),
+        encode=CatalogPage.to_row,
+        decode=CatalogPage.from_row,
+    )
 
-async def get_catalog(page: int = 1) -> dict:
-    """Fetch paginated catalog. Returns {"pages": N, "data": [...]}."""
-    cache_key = f"catalog:{page}"
-    cached = _cache_get(cache_key)
-    if cached is not None:
-        return cached
 
+async def _fetch_catalog(page: int) -> CatalogPage:
     async with httpx.AsyncClient(base_url=BASE_URL, timeout=TIMEOUT) as client:
-        resp = await client.get("/api/titles", params={"page": page})
-        resp.raise_for_status()
-        data = resp.json()
+        return await _fetch_catalog_page(client, page)
+
 
-    _cache_set(cache_key, data, CACHE_TTL_CATALOG)
-    return data
+async def _fetch_catalog_page(client: httpx.AsyncClient, page: int) -> CatalogPage:
+    resp = await client.get("/api/titles", params={"page": page})
+    resp.raise_for_status()
+    return CatalogPage.from_api(resp.json())
 
 
-async def get_all_titles() -> list[dict]:
+async def get_all_titles() -> tuple[TitleSummary, ...]:
     """Fetch ALL titles from catalog (all pages). Cached for 5 min."""
-    cache_key = "all_titles"
-    cached = _cache_get(cache_key)
-    if cached is not None:
-        return cached
+    return await cache.get_backend().get_or_fetch(
+        "all_titles",
+        CACHE_TTL_CATALOG,
+        _fetch_all_titles,
+        encode=lambda titles: [t.to_row() for t in titles],
+        decode=lambda rows: tuple(TitleSummary.from_row(r) for r in rows),
+    )
 
-    all_titles: list[dict] = []
+
+async def _fetch_all_titles() -> tuple[TitleSummary, ...]:
+    # Crawl fresh pages (so all_titles is never older than CACHE_TTL_CATALOG)
+    # over one connection, and refresh the page cache with them on the way
+    backend = cache.get_backend()
+    semaphore = asyncio.Semaphore(CRAWL_CONCURRENCY)
 
     async with httpx.AsyncClient(base_url=BASE_URL, timeout=TIMEOUT) as client:
-        resp = await client.get("/api/titles", params={"page": 1})
-        resp.raise_for_status()
-        first_page = resp.json()
 
-        total_pages = first_page.get("pages", 1)
-        all_titles.extend(first_page.get("data", []))
+        async def fetch_page(page: int) -> CatalogPage:
+            async with semaphore:
+                data = await _fetch_catalog_page(client, page)
+            await backend.put(
+                f"catalog:{page}", data, CACHE_TTL_CATALOG, encode=CatalogPage.to_row
+            )
+            return data
 
-        for page in range(2, total_pages + 1):
-            resp = await client.get("/api/titles", params={"page": page})
-            resp.raise_for_status()
-            all_titles.extend(resp.json().get("data", []))
+        first_page = await fetch_page(1)
+        other_pages = await asyncio.gather(
+            *(fetch_page(page) for page in range(2, first_page.pages + 1))
+        )
 
-    _cache_set(cache_key, all_titles, CACHE_TTL_CATALOG)
-    return all_titles
+    return tuple(t for page in (first_page, *other_pages) for t in page.titles)
 
 
-async def get_title(title_id: int) -> dict:
+async def get_title(title_id: int) -> Title:
     """Fetch single title detail. NB: endpoint is /api/title/ (singular)."""
-    cache_key = f"title:{title_id}"
-    cached = _cache_get(cache_key)
-    if cached is not None:
-        return cached
+    return await cache.get_backend().get_or_fetch(
+        f"title:{title_id}",
+        CACHE_TTL_TITLE,
+        lambda: _fetch_title(title_id),
+        encode=Title.to_row,
+        decode=Title.from_row,
+    )
 
+
+async def _fetch_title(title_id: int) -> Title:
     async with httpx.AsyncClient(base_url=BASE_URL, timeout=TIMEOUT) as client:
         resp = await client.get(f"/api/title/{title_id}")
         resp.raise_for_status()
-        data = resp.json()
+        return Title.from_api(resp.json())
 
-    _cache_set(cache_key, data, CACHE_TTL_TITLE)
-    return data
 
+async def get_episodes(title_id: int) -> EpisodeList:
+    """Fetch ALL episodes for a title (all pages), sorted by number."""
+    return await cache.get_backend().get_or_fetch(
+        f"episodes:{title_id}",
+        CACHE_TTL_EPISODES,
+        lambda: _fetch_episodes(title_id),
+        encode=EpisodeList.to_row,
+        decode=EpisodeList.from_row,
+    )
 
-async def get_episodes(title_id: int) -> list[dict]:
-    """Fetch ALL episodes for a title (all pages). Returns flat list."""
-    cache_key = f"episodes:{title_id}"
-    cached = _cache_get(cache_key)
-    if cached is not None:
-        return cached
 
+async def _fetch_episodes(title_id: int) -> EpisodeList:
     all_episodes: list[dict] = []
 
     async with httpx.AsyncClient(base_url=BASE_URL, timeout=TIMEOUT) as client:
@@ -119,24 +127,25 @@ async def get_episodes(title_id: int) -> list[dict]:
             page_data = resp.json()
             all_episodes.extend(page_data.get("data", []))
 
-    # Sort by episode number
-    all_episodes.sort(key=lambda ep: ep.get("number", 0))
-
-    _cache_set(cache_key, all_episodes, CACHE_TTL_EPISODES)
-    return all_episodes
+    # Sorts by episode number
+    return EpisodeList.from_api(all_episodes)
 
 
 async def get_filters() -> dict:
     """Fetch available genres and years for filtering."""
-    cache_key = "filters"
-    cached = _cache_get(cache_key)
-    if cached is not None:
-        return cached
+    return await cache.get_backend().get_or_fetch(
+        "filters", CACHE_TTL_CATALOG, _fetch_filters
+    )
 
+
+async def _fetch_filters() -> dict:
     async with httpx.AsyncClient(base_url=BASE_URL, timeout=TIMEOUT) as client:
         resp = await client.get("/api/filters")
         resp.raise_for_status()
-        data = resp.json()
+        return resp.json()
+
 
-    _cache_set(cache_key, data, CACHE_TTL_CATALOG)
-    return data
+async def get_episode_bot_id(title_id: int, number: int) -> int | None:
+    """Look up an episode's Telegram bot_id by its number."""
+    episodes = await get_episodes(title_id)
+    return episodes.bot_id(number)
@@ -0,0 +1,301 @@
+"""
+Pluggable cache backends shared by the API client and the Telegram bridge.
+
+Backend is picked by CACHE_URL:
+  memory://                 — per-process dict (default)
+  sqlite:///cache.db        — shared between workers on one host
+  redis://host:6379/0       — shared between hosts (needs `redis` package)
+
+Values must be JSON-serializable (or come with encode/decode, see
+get_or_fetch). Every backend also provides a
+single-flight lock, so only one worker refreshes a given key.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, closing
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+log = logging.getLogger("cache")
+
+LOCK_WAIT = 60  # give up waiting and fetch anyway after this many seconds
+LOCK_TTL = 120  # holder crashed? lock expires after this many seconds (> any wait)
+LOCK_POLL = 0.1
+
+# Result handed to waiters when the fetching coroutine was cancelled: try again
+_RETRY = object()
+
+
+class CacheBackend(ABC):
+    """Base interface. Subclasses implement get/set and the cross-process lock."""
+
+    shared = True  # values cross process boundaries, so must be JSON-serializable
+
+    def __init__(self) -> None:
+        # Coroutines in the same process wait on an asyncio.Lock first,
+        # so only one of them polls the shared lock. key -> (lock, users)
+        self._local_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+        # key -> result of the fetch running in this process right now
+        self._pending: dict[str, asyncio.Future] = {}
+
+    @abstractmethod
+    async def get(self, key: str) -> Any | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, data: Any, ttl: float) -> None: ...
+
+    @abstractmethod
+    async def _try_acquire(self, key: str, token: str) -> bool: ...
+
+    @abstractmethod
+    async def _release(self, key: str, token: str) -> None: ...
+
+    @asynccontextmanager
+    async def lock(self, key: str, wait: float = LOCK_WAIT) -> AsyncIterator[None]:
+        """
+        Hold `key` exclusively across coroutines and (if shared) processes.
+        `wait` must cover the longest work done under the lock, otherwise
+        other workers give up waiting and do the same work themselves.
+        """
+        local, users = self._local_locks.get(key, (asyncio.Lock(), 0))
+        self._local_locks[key] = (local, users + 1)
+        try:
+            async with local:
+                token = uuid.uuid4().hex
+                deadline = time.time() + min(wait, LOCK_TTL)
+                acquired = await self._try_acquire(key, token)
+                while not acquired and time.time() < deadline:
+                    await asyncio.sleep(LOCK_POLL)
+                    acquired = await self._try_acquire(key, token)
+                if not acquired:
+                    log.warning(f"Lock wait timed out for {key}, fetching anyway")
+                try:
+                    yield
+                finally:
+                    if acquired:
+                        await self._release(key, token)
+        finally:
+            local, users = self._local_locks[key]
+            if users > 1:
+                self._local_locks[key] = (local, users - 1)
+            else:
+                del self._local_locks[key]
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        ttl: float,
+        fetch: Callable[[], Awaitable[Any]],
+        encode: Callable[[Any], Any] | None = None,
+        decode: Callable[[Any], Any] | None = None,
+    ) -> Any:
+        """
+        Return cached value or fetch it once, even with many concurrent callers.
+        Callers in this process share the fetch's result — or its error, so a
+        failing upstream fails them all together instead of one by one.
+        encode/decode convert objects to a JSON-safe form; they only run
+        for shared backends, the memory backend keeps objects as they are.
+        """
+        while True:
+            cached = await self._get_decoded(key, decode)
+            if cached is not None:
+                return cached
+
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            result = await asyncio.shield(pending)
+            if result is not _RETRY:
+                return result
+
+        pending = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting — don't warn about an unretrieved error
+        pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending[key] = pending
+        try:
+            async with self.lock(key):
+                # Another worker may have refreshed it while we waited
+                data = await self._get_decoded(key, decode)
+                if data is None:
+                    data = await fetch()
+                    await self.put(key, data, ttl, encode)
+            pending.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            pending.set_result(_RETRY)
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            del self._pending[key]
+
+    async def put(
+        self, key: str, data: Any, ttl: float, encode: Callable[[Any], Any] | None = None
+    ) -> None:
+        """set() with the same encode hook as get_or_fetch."""
+        await self.set(key, encode(data) if encode and self.shared else data, ttl)
+
+    async def _get_decoded(self, key: str, decode: Callable[[Any], Any] | None) -> Any | None:
+        cached = await self.get(key)
+        if cached is not None and decode and self.shared:
+            return decode(cached)
+        return cached
+
+
+class MemoryBackend(CacheBackend):
+    """Simple TTL cache: {key: (data, expires_at)}. Not shared between processes."""
+
+    shared = False
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._cache: dict[str, tuple[Any, float]] = {}
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if time.time() > expires_at:
+            del self._cache[key]
+            return None
+        return data
+
+    async def set(self, key: str, data: Any, ttl: float) -> None:
+        self._cache[key] = (data, time.time() + ttl)
+
+    async def _try_acquire(self, key: str, token: str) -> bool:
+        # The asyncio.Lock in CacheBackend.lock is already enough
+        return True
+
+    async def _release(self, key: str, token: str) -> None:
+        pass
+
+
+class SQLiteBackend(CacheBackend):
+    """SQLite file shared by all workers on one host (WAL mode)."""
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self._path = path
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS locks "
+                "(key TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._path, timeout=5, isolation_level=None)
+
+    def _get_sync(self, key: str) -> Any | None:
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT data FROM cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_sync(self, key: str, payload: str, ttl: float) -> None:
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT OR REPLACE INTO cache (key, data, expires_at) VALUES (?, ?, ?)",
+                (key, payload, now + ttl),
+            )
+            db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def _try_acquire_sync(self, key: str, token: str) -> bool:
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM locks WHERE key = ? AND expires_at <= ?", (key, now))
+            cur = db.execute(
+                "INSERT OR IGNORE INTO locks (key, token, expires_at) VALUES (?, ?, ?)",
+                (key, token, now + LOCK_TTL),
+            )
+            return cur.rowcount == 1
+
+    def _release_sync(self, key: str, token: str) -> None:
+        with closing(self._connect()) as db:
+            db.execute("DELETE FROM locks WHERE key = ? AND token = ?", (key, token))
+
+    async def get(self, key: str) -> Any | None:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def set(self, key: str, data: Any, ttl: float) -> None:
+        await asyncio.to_thread(self._set_sync, key, json.dumps(data), ttl)
+
+    async def _try_acquire(self, key: str, token: str) -> bool:
+        return await asyncio.to_thread(self._try_acquire_sync, key, token)
+
+    async def _release(self, key: str, token: str) -> None:
+        await asyncio.to_thread(self._release_sync, key, token)
+
+
+# Delete the lock only if we still own it
+_REDIS_RELEASE = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend(CacheBackend):
+    """Redis (or any Redis-protocol server) shared by all workers and hosts."""
+
+    def __init__(self, url: str) -> None:
+        super().__init__()
+        import redis.asyncio as redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Any | None:
+        raw = await self._redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, data: Any, ttl: float) -> None:
+        await self._redis.set(key, json.dumps(data), px=int(ttl * 1000))
+
+    async def _try_acquire(self, key: str, token: str) -> bool:
+        return bool(
+            await self._redis.set(f"lock:{key}", token, nx=True, px=LOCK_TTL * 1000)
+        )
+
+    async def _release(self, key: str, token: str) -> None:
+        await self._redis.eval(_REDIS_RELEASE, 1, f"lock:{key}", token)
+
+
+def create_backend(url: str) -> CacheBackend:
+    """Build a backend from a CACHE_URL-style string."""
+    if url.startswith("sqlite://"):
+        return SQLiteBackend(url[len("sqlite://"):].removeprefix("/") or "cache.db")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    if url.startswith("memory://"):
+        return MemoryBackend()
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+_backend: CacheBackend | None = None
+
+
+def get_backend() -> CacheBackend:
+    """Get or create the process-wide backend configured by CACHE_URL."""
+    global _backend
+    if _backend is None:
+        # Read lazily so a CACHE_URL from .env (loaded by telegram_stream) applies
+        _backend = create_backend(os.getenv("CACHE_URL", "memory://"))
+        log.info(f"Cache backend: {type(_backend).__name__}")
+    return _backend
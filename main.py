@@ -6,16 +6,23 @@ Streams video from Telegram via Pyrogram proxy.
 Run: uvicorn main:app --host 0.0.0.0 --port 7000
 """
 
+import asyncio
+import json
 import logging
 import os
+import re
+from itertools import islice
+from typing import Any, AsyncGenerator, Callable, Iterable
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
 
 import amonogawa_client as api
 import stremio
 import telegram_stream as tg
+from models import EMPTY_EPISODES, EpisodeList, Title
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("amonogawa-addon")
@@ -33,6 +40,11 @@ app.add_middleware(
 )
 
 ITEMS_PER_PAGE = 10  # Amonogawa returns 10 per page
+BATCH_MAX_IDS = 100  # titles per /batch request
+BATCH_CONCURRENCY = 8  # parallel upstream lookups per /batch request
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "100"))  # metas per search page
+JSON_BATCH = 256  # items mapped + encoded per worker-thread hop; smaller responses aren't streamed
+SKIP_SUFFIX = re.compile(r"&skip=(\d+)$")
 
 
 @app.get("/manifest.json")
@@ -52,7 +64,13 @@ async def catalog_with_skip(type: str, catalog_id: str, skip: int):
 
 @app.get("/catalog/{type}/{catalog_id}/search={query}.json")
 async def catalog_search(type: str, catalog_id: str, query: str):
-    """Search across all titles. Loads full catalog and filters by name."""
+    """
+    Search across all titles. Loads full catalog and filters by name.
+    Paginated by SEARCH_PAGE_SIZE; Stremio asks for the next page
+    as "search=...&skip=N". Large pages are streamed as JSON.
+    """
+    # "naruto&skip=100" → query="naruto", skip=100
+    query, skip = _split_skip(query)
     is_movie = type == "movie"
     query_lower = query.lower()
 
@@ -65,15 +83,17 @@ async def catalog_search(type: str, catalog_id: str, query: str):
     # Filter by type + name match (Ukrainian name OR en/jp name)
     filtered = []
     for t in all_titles:
-        if t.get("is_movie", False) != is_movie:
+        if t.is_movie != is_movie:
             continue
-        name = (t.get("name") or "").lower()
-        en_jp = (t.get("en_jp_name") or "").lower()
+        name = (t.name or "").lower()
+        en_jp = (t.en_jp_name or "").lower()
         if query_lower in name or query_lower in en_jp:
             filtered.append(t)
 
-    metas = [stremio.to_catalog_meta(t) for t in filtered]
-    return {"metas": metas}
+    page = filtered[skip:skip + SEARCH_PAGE_SIZE]
+    if len(page) <= JSON_BATCH:
+        return {"metas": [stremio.to_catalog_meta(t) for t in page]}
+    return await _stream_json_array(b'{"metas":[', page, stremio.to_catalog_meta, b"]}")
 
 
 async def _get_catalog(type: str, catalog_id: str, skip: int) -> dict:
@@ -87,10 +107,8 @@ async def _get_catalog(type: str, catalog_id: str, skip: int) -> dict:
         log.error(f"Failed to fetch catalog page {page}: {e}")
         return {"metas": []}
 
-    titles = data.get("data", [])
-
     # Filter by series/movie
-    filtered = [t for t in titles if t.get("is_movie", False) == is_movie]
+    filtered = [t for t in data.titles if t.is_movie == is_movie]
 
     metas = [stremio.to_catalog_meta(t) for t in filtered]
     return {"metas": metas}
@@ -103,22 +121,23 @@ async def meta(type: str, id: str):
     if title_id is None:
         return {"meta": None}
 
-    try:
-        title = await api.get_title(title_id)
-    except Exception as e:
-        log.error(f"Failed to fetch title {title_id}: {e}")
+    resolved = await _resolve_title(title_id)
+    if resolved is None:
         return {"meta": None}
 
-    # Fetch episodes for series
-    episodes = []
-    if not title.get("is_movie", False):
-        try:
-            episodes = await api.get_episodes(title_id)
-        except Exception as e:
-            log.error(f"Failed to fetch episodes for {title_id}: {e}")
-
-    meta_obj = stremio.to_meta(title, episodes)
-    return {"meta": meta_obj}
+    title, episodes = resolved
+    if title.is_movie or len(episodes) <= JSON_BATCH:
+        return {"meta": stremio.to_meta(title, episodes)}
+
+    # Long-running shows: stream the videos list instead of building it whole.
+    # The head is a dict, so its JSON ends with "}" — reopen it to append videos.
+    head = _dumps(stremio.to_meta(title, EMPTY_EPISODES))
+    return await _stream_json_array(
+        b'{"meta":' + head[:-1] + b',"videos":[',
+        episodes,
+        lambda ep: stremio.to_video(title, ep),
+        b"]}}",
+    )
 
 
 @app.get("/stream/{type}/{id}.json")
@@ -129,26 +148,154 @@ async def stream(type: str, id: str):
     if title_id is None:
         return {"streams": []}
 
-    try:
-        title = await api.get_title(title_id)
-    except Exception as e:
-        log.error(f"Failed to fetch title {title_id} for stream: {e}")
+    # Title and episode lookup are independent — run them together
+    lookups = [api.get_title(title_id)]
+    if episode_num is not None:
+        lookups.append(api.get_episode_bot_id(title_id, episode_num))
+    title, *bot_id_result = await asyncio.gather(*lookups, return_exceptions=True)
+
+    if isinstance(title, Exception):
+        log.error(f"Failed to fetch title {title_id} for stream: {title}")
         return {"streams": []}
 
     # Find the episode's bot_id for Telegram streaming
     episode_bot_id = None
-    if episode_num is not None:
+    if bot_id_result:
+        if isinstance(bot_id_result[0], Exception):
+            log.error(f"Failed to fetch episodes for stream: {bot_id_result[0]}")
+        else:
+            episode_bot_id = bot_id_result[0]
+
+    streams = stremio.to_streams(title, episode_num, episode_bot_id, BASE_URL)
+    return {"streams": streams}
+
+
+@app.get("/batch/meta.json")
+async def batch_meta(ids: str):
+    """
+    Resolve many titles at once: ?ids=amngw:1,amngw:2,...
+    Returns full metas plus stream descriptors keyed by video id.
+    Meant for cache warmers and clients that prefetch. Ids past the first
+    BATCH_MAX_IDS distinct ones come back unresolved in "remaining" —
+    send them in another request.
+    """
+    raw_ids = ids.split(",")
+    title_ids: dict[int, None] = {}  # ordered set
+    remaining: list[str] = []
+    for i, raw_id in enumerate(raw_ids):
+        if len(title_ids) == BATCH_MAX_IDS:
+            # Leftovers go back as-is, minus repeats of ids already resolved here
+            remaining = [
+                r.strip()
+                for r in raw_ids[i:]
+                if r.strip() and _parse_title_id(r.strip()) not in title_ids
+            ]
+            break
+        title_id = _parse_title_id(raw_id.strip())
+        if title_id is not None:
+            title_ids[title_id] = None
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def resolve(title_id: int):
+        async with semaphore:
+            return await _resolve_title(title_id)
+
+    results = await asyncio.gather(*(resolve(title_id) for title_id in title_ids))
+
+    metas = []
+    streams: dict[str, list[dict]] = {}
+    for resolved in results:
+        if resolved is None:
+            continue
+        title, episodes = resolved
+        meta_obj = stremio.to_meta(title, episodes)
+        metas.append(meta_obj)
+
+        if title.is_movie:
+            streams[meta_obj["id"]] = stremio.to_streams(title)
+            continue
+        for ep in episodes:
+            ep_number = ep.number
+            video_id = f"{meta_obj['id']}:{ep_number}"
+            if video_id not in streams:
+                streams[video_id] = stremio.to_streams(
+                    title, ep_number, ep.bot_id, BASE_URL
+                )
+
+    response = {"metas": metas, "streams": streams}
+    if remaining:
+        response["remaining"] = remaining
+    return response
+
+
+async def _stream_json_array(
+    prefix: bytes, items: Iterable, to_dict: Callable[[Any], dict], suffix: bytes
+) -> StreamingResponse:
+    """
+    Stream `prefix item,item,... suffix` as JSON. Items are mapped and
+    encoded in batches in a worker thread, so big payloads don't hold up
+    the event loop.
+
+    The first batch is encoded before the response starts, so a mapping
+    error there is still an ordinary 500. A later error is logged and
+    aborts the response, so the client sees a broken body, not valid JSON.
+    """
+    items_iter = iter(items)
+    first_batch = await asyncio.to_thread(
+        _encode_items, list(islice(items_iter, JSON_BATCH)), to_dict
+    )
+
+    async def body() -> AsyncGenerator[bytes, None]:
+        yield prefix + first_batch
+        try:
+            while batch := list(islice(items_iter, JSON_BATCH)):
+                yield b"," + await asyncio.to_thread(_encode_items, batch, to_dict)
+        except Exception as e:
+            log.error(f"Streamed JSON response failed midway: {e}", exc_info=True)
+            raise
+        yield suffix
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+def _encode_items(items: list, to_dict: Callable[[Any], dict]) -> bytes:
+    return b",".join(_dumps(to_dict(item)) for item in items)
+
+
+def _dumps(obj: Any) -> bytes:
+    # Same output as FastAPI's JSONResponse
+    return json.dumps(
+        obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _split_skip(query: str) -> tuple[str, int]:
+    """Parse 'naruto&skip=100' → ('naruto', 100)."""
+    # Only a trailing skip counts: the query is already percent-decoded and may contain "&"
+    match = SKIP_SUFFIX.search(query)
+    if match is None:
+        return query, 0
+    return query[:match.start()], int(match.group(1))
+
+
+async def _resolve_title(title_id: int) -> tuple[Title, EpisodeList] | None:
+    """Fetch a title and (for series) its episodes. None if the title fails."""
+    try:
+        title = await api.get_title(title_id)
+    except Exception as e:
+        log.error(f"Failed to fetch title {title_id}: {e}")
+        return None
+
+    # Fetch episodes for series
+    episodes = EMPTY_EPISODES
+    if not title.is_movie:
         try:
             episodes = await api.get_episodes(title_id)
-            for ep in episodes:
-                if ep.get("number") == episode_num:
-                    episode_bot_id = ep.get("bot_id")
-                    break
         except Exception as e:
-            log.error(f"Failed to fetch episodes for stream: {e}")
+            log.error(f"Failed to fetch episodes for {title_id}: {e}")
 
-    streams = stremio.to_streams(title, episode_num, episode_bot_id, BASE_URL)
-    return {"streams": streams}
+    return title, episodes
 
 
 @app.get("/tg/stream/{episode_bot_id}")
@@ -180,14 +327,67 @@ async def tg_stream(episode_bot_id: int, request: Request):
     else:
         status_code = 200
 
-    return StreamingResponse(
-        tg.stream_video(message, byte_offset=byte_offset),
+    session = tg.get_session(episode_bot_id, message, file_size)
+    return VideoStreamResponse(
+        tg.stream_video(session, byte_offset=byte_offset),
         status_code=status_code,
         headers=headers,
-        media_type="video/mp4",
     )
 
 
+class VideoStreamResponse(Response):
+    """
+    Writes Telegram chunks straight to the ASGI send channel.
+
+    Unlike StreamingResponse there is no per-chunk re-encoding and no task
+    group: chunks go out as-is, and `await send(...)` blocks while
+    the server's transport is paused, so a slow player throttles the
+    Telegram download instead of piling chunks up in memory.
+    """
+
+    media_type = "video/mp4"
+
+    def __init__(
+        self,
+        chunks: AsyncGenerator[bytes, None],
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        self.chunks = chunks
+        self.status_code = status_code
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect() -> None:
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": self.status_code,
+                    "headers": self.raw_headers,
+                }
+            )
+            async for chunk in self.chunks:
+                if disconnected.is_set():
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except OSError:
+            pass  # client went away mid-write
+        finally:
+            watcher.cancel()
+            await self.chunks.aclose()
+
+
 @app.on_event("shutdown")
 async def shutdown():
     await tg.stop_client()
@@ -0,0 +1,352 @@
+"""
+Compact records for Amonogawa API data.
+Keep only the fields stremio.py reads, intern repeated strings, and
+deduplicate catalog titles across pages and the full title list.
+"""
+
+import logging
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterator
+from weakref import WeakValueDictionary
+
+
+log = logging.getLogger("models")
+
+# Range of the "q" arrays episode numbers and bot_ids are stored in
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _as_int(value: Any) -> int | None:
+    """Exact integer from an int, integral float or numeric string; None otherwise."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, float):
+        value = int(value) if value.is_integer() else None
+    elif isinstance(value, str):
+        try:
+            value = int(value.strip())
+        except ValueError:
+            value = None
+    if not isinstance(value, int) or not _INT64_MIN <= value <= _INT64_MAX:
+        return None
+    return value
+
+
+class Record:
+    """Base for slotted records. `to_row`/`from_row` give a JSON-safe form for shared caches."""
+
+    __slots__ = ()
+    _fields: tuple[str, ...] = ()
+
+    def to_row(self) -> list:
+        return [getattr(self, f) for f in self._fields]
+
+    @classmethod
+    def from_row(cls, row: list):
+        return cls(*row)
+
+    def __eq__(self, other: object) -> bool:
+        return type(other) is type(self) and self.to_row() == other.to_row()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class TitleSummary(Record):
+    """Catalog item — what a catalog/search row needs."""
+
+    __slots__ = (
+        "id", "name", "en_jp_name", "is_movie", "year", "season", "part",
+        "episodes_total", "schedule", "poster", "__weakref__",
+    )
+    _fields = __slots__[:-1]
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        en_jp_name: str | None,
+        is_movie: bool,
+        year: int | None,
+        season: int | None,
+        part: int | None,
+        episodes_total: int | None,
+        schedule: str | None,
+        poster: str,
+    ) -> None:
+        self.id = id
+        self.name = _intern(name)
+        self.en_jp_name = _intern(en_jp_name)
+        self.is_movie = is_movie
+        self.year = year
+        self.season = season
+        self.part = part
+        self.episodes_total = episodes_total
+        self.schedule = _intern(schedule)
+        self.poster = poster
+
+    @classmethod
+    def from_api(cls, data: dict) -> "TitleSummary":
+        return _dedupe(
+            cls(
+                id=data["id"],
+                name=data.get("name", data.get("en_jp_name", "Unknown")),
+                en_jp_name=data.get("en_jp_name"),
+                is_movie=bool(data.get("is_movie", False)),
+                year=data.get("year"),
+                season=data.get("season"),
+                part=data.get("part"),
+                episodes_total=data.get("episodes_total"),
+                schedule=data.get("schedule"),
+                poster=data.get("poster_thumb") or data.get("poster_mini", ""),
+            )
+        )
+
+    @classmethod
+    def from_row(cls, row: list) -> "TitleSummary":
+        return _dedupe(cls(*row))
+
+
+# id -> live TitleSummary; the same title on a page and in all_titles is one object
+_summaries: "WeakValueDictionary[int, TitleSummary]" = WeakValueDictionary()
+
+
+def _dedupe(title: TitleSummary) -> TitleSummary:
+    existing = _summaries.get(title.id)
+    if existing is not None and existing == title:
+        return existing
+    _summaries[title.id] = title
+    return title
+
+
+class CatalogPage(Record):
+    """One page of /api/titles."""
+
+    __slots__ = ("pages", "titles")
+    _fields = __slots__
+
+    def __init__(self, pages: int, titles: tuple[TitleSummary, ...]) -> None:
+        self.pages = pages
+        self.titles = titles
+
+    @classmethod
+    def from_api(cls, data: dict) -> "CatalogPage":
+        titles = tuple(TitleSummary.from_api(t) for t in data.get("data", []))
+        return cls(data.get("pages", 1), titles)
+
+    def to_row(self) -> list:
+        return [self.pages, [t.to_row() for t in self.titles]]
+
+    @classmethod
+    def from_row(cls, row: list) -> "CatalogPage":
+        return cls(row[0], tuple(TitleSummary.from_row(t) for t in row[1]))
+
+
+class Title(Record):
+    """Title detail — what a full meta and its streams need."""
+
+    __slots__ = (
+        "id", "name", "en_jp_name", "is_movie", "year", "season", "part",
+        "poster", "background", "genres", "director", "description",
+        "duration", "torrent_url", "torrent_4k_url",
+    )
+    _fields = __slots__
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        en_jp_name: str | None,
+        is_movie: bool,
+        year: int | None,
+        season: int | None,
+        part: int | None,
+        poster: str,
+        background: str | None,
+        genres: tuple[str, ...],
+        director: str | None,
+        description: str,
+        duration: Any,
+        torrent_url: str | None,
+        torrent_4k_url: str | None,
+    ) -> None:
+        self.id = id
+        self.name = _intern(name)
+        self.en_jp_name = _intern(en_jp_name)
+        self.is_movie = is_movie
+        self.year = year
+        self.season = season
+        self.part = part
+        self.poster = poster
+        self.background = background
+        self.genres = tuple(_intern(g) for g in genres)
+        self.director = _intern(director)
+        self.description = description
+        self.duration = _intern(duration)
+        self.torrent_url = torrent_url
+        self.torrent_4k_url = torrent_4k_url
+
+    @classmethod
+    def from_api(cls, data: dict) -> "Title":
+        # Only the first full-size screenshot is used (as background)
+        screens = data.get("screens_f") or []
+        background = screens[0][0] if screens and screens[0] else None
+        return cls(
+            id=data["id"],
+            name=data.get("name", data.get("en_jp_name", "Unknown")),
+            en_jp_name=data.get("en_jp_name"),
+            is_movie=bool(data.get("is_movie", False)),
+            year=data.get("year"),
+            # Missing season means 1; an explicit null stays None, as upstream sent it
+            season=data.get("season", 1),
+            part=data.get("part"),
+            poster=data.get("poster", ""),
+            background=background,
+            genres=tuple(g[1] for g in data.get("genres_f", []) if len(g) > 1),
+            director=data.get("director"),
+            description=data.get("descrition", ""),  # their typo
+            duration=data.get("duration", ""),
+            torrent_url=data.get("torrent_url"),
+            torrent_4k_url=data.get("torrent_4k_url"),
+        )
+
+
+class Episode(Record):
+    """Single episode, as yielded by EpisodeList."""
+
+    __slots__ = ("number", "name", "is_ova", "is_extra", "screen", "post_date", "bot_id")
+    _fields = __slots__
+
+    def __init__(
+        self,
+        number: int,
+        name: str,
+        is_ova: bool,
+        is_extra: bool,
+        screen: str,
+        post_date: str | None,
+        bot_id: int | None,
+    ) -> None:
+        self.number = number
+        self.name = name
+        self.is_ova = is_ova
+        self.is_extra = is_extra
+        self.screen = screen
+        self.post_date = post_date
+        self.bot_id = bot_id
+
+
+_OVA = 1
+_EXTRA = 2
+
+
+class EpisodeList:
+    """
+    All episodes of a title as parallel arrays, sorted by number.
+    Iterating yields Episode records; bot_id() is a binary search.
+    """
+
+    __slots__ = ("numbers", "bot_ids", "flags", "names", "screens", "post_dates")
+
+    def __init__(
+        self,
+        numbers: array,
+        bot_ids: array,
+        flags: bytes,
+        names: tuple[str, ...],
+        screens: tuple[str, ...],
+        post_dates: tuple[str | None, ...],
+    ) -> None:
+        self.numbers = numbers
+        self.bot_ids = bot_ids  # 0 = no bot_id
+        self.flags = flags
+        self.names = names
+        self.screens = screens
+        self.post_dates = post_dates
+
+    @classmethod
+    def from_api(cls, episodes: list[dict]) -> "EpisodeList":
+        rows = []
+        for ep in episodes:
+            number = _as_int(ep.get("number") or 0)
+            if number is None:
+                # Can't be addressed as "amngw:<id>:<number>" — drop just this one
+                log.warning(f"Skipping episode with non-integer number: {ep.get('number')!r}")
+                continue
+            bot_id = _as_int(ep.get("bot_id") or 0)
+            if bot_id is None:
+                log.warning(f"Ignoring bad bot_id {ep.get('bot_id')!r} of episode {number}")
+                bot_id = 0
+            rows.append((number, bot_id, ep))
+
+        # Sort by episode number (stable — duplicates keep upstream order)
+        rows.sort(key=lambda row: row[0])
+        return cls(
+            array("q", (number for number, _, _ in rows)),
+            array("q", (bot_id for _, bot_id, _ in rows)),
+            bytes(
+                (_OVA if ep.get("is_ova") else 0) | (_EXTRA if ep.get("is_extra") else 0)
+                for _, _, ep in rows
+            ),
+            tuple(sys.intern(ep.get("name") or "") for _, _, ep in rows),
+            tuple(ep.get("screen") or "" for _, _, ep in rows),
+            tuple(ep.get("post_date") for _, _, ep in rows),
+        )
+
+    def to_row(self) -> list:
+        return [
+            self.numbers.tolist(),
+            self.bot_ids.tolist(),
+            list(self.flags),
+            list(self.names),
+            list(self.screens),
+            list(self.post_dates),
+        ]
+
+    @classmethod
+    def from_row(cls, row: list) -> "EpisodeList":
+        numbers, bot_ids, flags, names, screens, post_dates = row
+        return cls(
+            array("q", numbers),
+            array("q", bot_ids),
+            bytes(flags),
+            tuple(sys.intern(n) for n in names),
+            tuple(screens),
+            tuple(post_dates),
+        )
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __iter__(self) -> Iterator[Episode]:
+        for i, number in enumerate(self.numbers):
+            flags = self.flags[i]
+            yield Episode(
+                number,
+                self.names[i],
+                bool(flags & _OVA),
+                bool(flags & _EXTRA),
+                self.screens[i],
+                self.post_dates[i],
+                self.bot_ids[i] or None,
+            )
+
+    def bot_id(self, number: int) -> int | None:
+        """bot_id of the first episode with this number, or None."""
+        i = bisect_left(self.numbers, number)
+        if i < len(self.numbers) and self.numbers[i] == number:
+            return self.bot_ids[i] or None
+        return None
+
+
+EMPTY_EPISODES = EpisodeList(array("q"), array("q"), b"", (), (), ())
@@ -1,9 +1,11 @@
 """
 Stremio response builders.
 Pure mapping functions — no I/O, no API calls.
-Transforms Amonogawa API data into Stremio addon protocol format.
+Transforms Amonogawa records (see models.py) into Stremio addon protocol format.
 """
 
+from models import Episode, EpisodeList, Title, TitleSummary
+
 BASE_URL = "https://amanogawa.space"
 ID_PREFIX = "amngw:"
 
@@ -35,12 +37,12 @@ def build_manifest() -> dict:
     }
 
 
-def to_catalog_meta(title: dict) -> dict:
+def to_catalog_meta(title: TitleSummary) -> dict:
     """Map an Amonogawa catalog item to a Stremio catalog meta object."""
-    title_type = "movie" if title.get("is_movie") else "series"
-    year = title.get("year", "")
-    episodes = title.get("episodes_total", "")
-    schedule = title.get("schedule", "")
+    title_type = "movie" if title.is_movie else "series"
+    year = title.year
+    episodes = title.episodes_total
+    schedule = title.schedule
 
     # Build short description from available fields
     parts = []
@@ -52,14 +54,14 @@ def to_catalog_meta(title: dict) -> dict:
         parts.append(schedule)
     description = " • ".join(parts)
 
-    poster = title.get("poster_thumb") or title.get("poster_mini", "")
+    poster = title.poster
     if poster and not poster.startswith("http"):
         poster = BASE_URL + poster
 
     # Build display name with season/part/year to disambiguate
-    name = title.get("name", title.get("en_jp_name", "Unknown"))
-    season = title.get("season", 0)
-    part = title.get("part", 0)
+    name = title.name
+    season = title.season
+    part = title.part
 
     suffix_parts = []
     if season and season > 1:
@@ -74,7 +76,7 @@ def to_catalog_meta(title: dict) -> dict:
         name = f"{name} ({', '.join(suffix_parts)})"
 
     return {
-        "id": f"{ID_PREFIX}{title['id']}",
+        "id": f"{ID_PREFIX}{title.id}",
         "type": title_type,
         "name": name,
         "poster": poster,
@@ -83,68 +85,35 @@ def to_catalog_meta(title: dict) -> dict:
     }
 
 
-def to_meta(title: dict, episodes: list[dict]) -> dict:
+def to_meta(title: Title, episodes: EpisodeList) -> dict:
     """Map Amonogawa title + episodes to a full Stremio meta object."""
-    title_id = title["id"]
-    title_type = "movie" if title.get("is_movie") else "series"
-    season = title.get("season", 1)
+    title_id = title.id
+    title_type = "movie" if title.is_movie else "series"
+    season = title.season
 
     # Full poster
-    poster = title.get("poster", "")
+    poster = title.poster
     if poster and not poster.startswith("http"):
         poster = BASE_URL + poster
 
-    # Background from first screenshot
-    background = None
-    screens = title.get("screens_f", [])
-    if screens and len(screens) > 0:
-        background = screens[0][0]  # full-size screenshot
-        if background and not background.startswith("http"):
-            background = BASE_URL + background
+    # Background from first full-size screenshot
+    background = title.background
+    if background and not background.startswith("http"):
+        background = BASE_URL + background
 
     # Genres
-    genres = [g[1] for g in title.get("genres_f", []) if len(g) > 1]
+    genres = list(title.genres)
 
     # Director
-    director = title.get("director")
-    directors = [director] if director else []
+    directors = [title.director] if title.director else []
 
     # Videos (episodes)
-    videos = []
-    for ep in episodes:
-        ep_number = ep.get("number", 0)
-        ep_name = ep.get("name", "")
-
-        # Build episode title
-        if ep.get("is_ova"):
-            video_title = f"OVA — {ep_name}" if ep_name else "OVA"
-        elif ep.get("is_extra"):
-            video_title = f"Екстра — {ep_name}" if ep_name else "Екстра"
-        else:
-            video_title = f"Серія {ep_number} — {ep_name}" if ep_name else f"Серія {ep_number}"
-
-        # Thumbnail
-        thumb = ep.get("screen", "")
-        if thumb and not thumb.startswith("http"):
-            thumb = BASE_URL + thumb
-
-        video = {
-            "id": f"{ID_PREFIX}{title_id}:{ep_number}",
-            "title": video_title,
-            "season": season,
-            "episode": ep_number,
-        }
-        if thumb:
-            video["thumbnail"] = thumb
-        if ep.get("post_date"):
-            video["released"] = ep["post_date"]
-
-        videos.append(video)
+    videos = [to_video(title, ep) for ep in episodes]
 
     # Build display name with season/part disambiguation (same as catalog)
-    name = title.get("name", title.get("en_jp_name", "Unknown"))
-    part = title.get("part", 0)
-    year = title.get("year")
+    name = title.name
+    part = title.part
+    year = title.year
 
     suffix_parts = []
     if season and season > 1:
@@ -171,11 +140,11 @@ def to_meta(title: dict, episodes: list[dict]) -> dict:
         "id": f"{ID_PREFIX}{title_id}",
         "type": title_type,
         "name": name,
-        "description": title.get("descrition", ""),  # their typo
+        "description": title.description,
         "year": year,
         "poster": poster,
         "genres": genres,
-        "runtime": title.get("duration", ""),
+        "runtime": title.duration,
     }
 
     if release_info:
@@ -190,8 +159,40 @@ def to_meta(title: dict, episodes: list[dict]) -> dict:
     return meta
 
 
+def to_video(title: Title, ep: Episode) -> dict:
+    """Map one episode to a Stremio video object (an entry of meta["videos"])."""
+    season = title.season
+    ep_number = ep.number
+    ep_name = ep.name
+
+    # Build episode title
+    if ep.is_ova:
+        video_title = f"OVA — {ep_name}" if ep_name else "OVA"
+    elif ep.is_extra:
+        video_title = f"Екстра — {ep_name}" if ep_name else "Екстра"
+    else:
+        video_title = f"Серія {ep_number} — {ep_name}" if ep_name else f"Серія {ep_number}"
+
+    # Thumbnail
+    thumb = ep.screen
+    if thumb and not thumb.startswith("http"):
+        thumb = BASE_URL + thumb
+
+    video = {
+        "id": f"{ID_PREFIX}{title.id}:{ep_number}",
+        "title": video_title,
+        "season": season,
+        "episode": ep_number,
+    }
+    if thumb:
+        video["thumbnail"] = thumb
+    if ep.post_date:
+        video["released"] = ep.post_date
+    return video
+
+
 def to_streams(
-    title: dict,
+    title: Title,
     episode_num: int | None = None,
     episode_bot_id: int | None = None,
     base_url: str = "",
@@ -210,8 +211,8 @@ def to_streams(
         )
 
     # Toloka torrents (fallback)
-    torrent_url = title.get("torrent_url")
-    torrent_4k_url = title.get("torrent_4k_url")
+    torrent_url = title.torrent_url
+    torrent_4k_url = title.torrent_4k_url
 
     if torrent_url:
         streams.append(
@@ -7,6 +7,8 @@ import asyncio
 import logging
 import os
 import time
+from collections import OrderedDict, deque
+from contextlib import aclosing
 from datetime import datetime
 from typing import AsyncGenerator
 
@@ -14,6 +16,8 @@ from dotenv import load_dotenv
 from pyrogram import Client
 from pyrogram.types import Message
 
+import cache
+
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 
 log = logging.getLogger("tg-stream")
@@ -24,11 +28,24 @@ SESSION_DIR = os.path.dirname(__file__)
 BOT_USERNAME = "amanogawa_ua_bot"
 
 CHUNK_SIZE = 1024 * 1024  # 1 MiB — Pyrogram's internal chunk size
+BOT_TIMEOUT = 30  # seconds to wait for the bot's video reply
 
 # Cache: bot_id -> (Message, file_size, timestamp)
+# Message objects can't leave the process, so workers share only
+# (message_id, file_unique_id, file_size) via the cache backend and re-fetch
+# the Message by id, checking it's still the same file.
 _msg_cache: dict[int, tuple[Message, int, float]] = {}
 CACHE_TTL = 3600  # 1 hour
 
+# Range-request sessions: bot_id -> StreamSession, dropped after SESSION_TTL idle
+_sessions: dict[int, "StreamSession"] = {}
+SESSION_TTL = 60  # seconds
+SESSION_MAX_CHUNKS = 32  # buffered chunks per file (32 MiB)
+SESSIONS_MAX_BYTES = 256 * 1024 * 1024  # buffered chunks across all sessions
+READ_AHEAD_MIN = 1  # chunks fetched ahead while probing
+READ_AHEAD_MAX = 8  # chunks fetched ahead during steady playback
+DOWNLOAD_IDLE = 10  # seconds a paused download waits for readers before closing
+
 # Pyrogram client — initialized once at startup
 _client: Client | None = None
 
@@ -68,46 +85,106 @@ async def get_video_message(episode_bot_id: int) -> tuple[Message, int] | None:
         log.info(f"Cache hit for bot_id {episode_bot_id}")
         return cached[0], cached[1]
 
-    client = await get_client()
+    backend = cache.get_backend()
+    cache_key = f"tg:{episode_bot_id}"
 
     try:
-        # Record time BEFORE sending — only accept responses after this
-        # Pyrogram msg.date is naive UTC, so we use utcnow() for comparison
-        before_send = datetime.utcnow()
+        client = await get_client()
+
+        result = await _from_shared_cache(client, backend, episode_bot_id)
+        if result is not None:
+            return result
+
+        # Only one worker asks the bot; the others pick up its answer.
+        # Wait longer than a bot round trip (send + reply + last 1.5s poll)
+        async with backend.lock(cache_key, wait=BOT_TIMEOUT + 15):
+            result = await _from_shared_cache(client, backend, episode_bot_id)
+            if result is not None:
+                return result
+
+            result = await _request_from_bot(client, episode_bot_id)
+            if result is None:
+                return None
+
+            video_msg, file_size = result
+            _msg_cache[episode_bot_id] = (video_msg, file_size, time.time())
+            video = video_msg.video or video_msg.document
+            await backend.set(
+                cache_key, [video_msg.id, video.file_unique_id, file_size], CACHE_TTL
+            )
+            return result
 
-        # Send /start command with deep link parameter
-        deep_link = f"/start sep_{episode_bot_id}"
-        log.info(f"Sending to @{BOT_USERNAME}: {deep_link}")
-        await client.send_message(BOT_USERNAME, deep_link)
+    except Exception as e:
+        log.error(f"Failed to get video for bot_id {episode_bot_id}: {e}", exc_info=True)
+        return None
 
-        # Wait for bot response
-        video_msg = await _wait_for_video(client, after=before_send, timeout=30)
 
-        if video_msg is None:
-            log.warning(f"No video received for bot_id {episode_bot_id}")
-            return None
+async def _from_shared_cache(
+    client: Client, backend: cache.CacheBackend, episode_bot_id: int
+) -> tuple[Message, int] | None:
+    """
+    Re-fetch a Message another worker already got from the bot.
+    Message ids are per account, so a worker on another host (own session)
+    may get an unrelated message with that id — only trust it if it's the
+    same file. Any miss returns None, and the caller asks the bot itself.
+    """
+    shared = await backend.get(f"tg:{episode_bot_id}")
+    if shared is None or len(shared) != 3:
+        return None
 
-        # Extract file info
-        video = video_msg.video or video_msg.document
-        if video is None:
-            log.warning(f"Message has no video/document for bot_id {episode_bot_id}")
-            return None
+    msg_id, file_unique_id, file_size = shared
+    try:
+        video_msg = await client.get_messages(BOT_USERNAME, msg_id)
+    except Exception as e:
+        log.warning(f"Failed to re-fetch msg_id={msg_id} for bot_id {episode_bot_id}: {e}")
+        return None
+    if video_msg is None or video_msg.empty:
+        return None
 
-        file_size = video.file_size or 0
+    video = video_msg.video or video_msg.document
+    if video is None or video.file_unique_id != file_unique_id:
+        log.info(f"Shared msg_id={msg_id} is not bot_id {episode_bot_id}'s video here, ignoring")
+        return None
 
-        # Cache the full message object
-        _msg_cache[episode_bot_id] = (video_msg, file_size, time.time())
-        log.info(
-            f"Got video for bot_id {episode_bot_id}: "
-            f"size={file_size} ({file_size / 1024 / 1024:.1f} MB), "
-            f"file_id={video.file_id[:20]}..."
-        )
-        return video_msg, file_size
+    log.info(f"Shared cache hit for bot_id {episode_bot_id}: msg_id={msg_id}")
+    _msg_cache[episode_bot_id] = (video_msg, file_size, time.time())
+    return video_msg, file_size
 
-    except Exception as e:
-        log.error(f"Failed to get video for bot_id {episode_bot_id}: {e}", exc_info=True)
+
+async def _request_from_bot(
+    client: Client, episode_bot_id: int
+) -> tuple[Message, int] | None:
+    """Send /start sep_{bot_id} to the bot and wait for the video."""
+    # Record time BEFORE sending — only accept responses after this
+    # Pyrogram msg.date is naive UTC, so we use utcnow() for comparison
+    before_send = datetime.utcnow()
+
+    # Send /start command with deep link parameter
+    deep_link = f"/start sep_{episode_bot_id}"
+    log.info(f"Sending to @{BOT_USERNAME}: {deep_link}")
+    await client.send_message(BOT_USERNAME, deep_link)
+
+    # Wait for bot response
+    video_msg = await _wait_for_video(client, after=before_send, timeout=BOT_TIMEOUT)
+
+    if video_msg is None:
+        log.warning(f"No video received for bot_id {episode_bot_id}")
+        return None
+
+    # Extract file info
+    video = video_msg.video or video_msg.document
+    if video is None:
+        log.warning(f"Message has no video/document for bot_id {episode_bot_id}")
         return None
 
+    file_size = video.file_size or 0
+    log.info(
+        f"Got video for bot_id {episode_bot_id}: "
+        f"size={file_size} ({file_size / 1024 / 1024:.1f} MB), "
+        f"file_id={video.file_id[:20]}..."
+    )
+    return video_msg, file_size
+
 
 async def _wait_for_video(
     client: Client, after: datetime, timeout: int = 30
@@ -135,40 +212,294 @@ async def _wait_for_video(
     return None
 
 
+class _Download:
+    """One open stream_media download, paused while it's far enough ahead of its readers."""
+
+    __slots__ = ("next", "wanted", "wake", "waiters", "task")
+
+    def __init__(self, start: int) -> None:
+        self.next = start  # chunk it will produce next
+        self.wanted = start  # furthest chunk a reader has asked for
+        self.wake = asyncio.Event()
+        self.waiters: dict[int, asyncio.Future] = {}
+        self.task: asyncio.Task | None = None
+
+
+class StreamSession:
+    """
+    Short-lived state for one video, shared by all Range requests to it.
+
+    Players probe a file with several small requests (header, moov atom at
+    the end, then the playback position). The session keeps recently fetched
+    chunks, so a request inside an already-buffered range is served from
+    memory, and tracks where requests land: jumps around the file keep
+    read-ahead shallow, steady sequential reads ramp it up.
+
+    Each position the player reads from gets one open-ended stream_media
+    download. It runs at most `read_ahead` chunks ahead of its readers,
+    pauses there, and closes after DOWNLOAD_IDLE seconds without readers —
+    so steady playback is a single Telegram download, not one per window.
+
+    Buffers across all sessions are capped at SESSIONS_MAX_BYTES (least
+    recently used session cleared first), and a session is dropped by a
+    timer SESSION_TTL after its last reader leaves.
+    """
+
+    def __init__(self, episode_bot_id: int, message: Message, file_size: int) -> None:
+        self.episode_bot_id = episode_bot_id
+        self.message = message
+        self.file_size = file_size
+        self.total_chunks = -(-file_size // CHUNK_SIZE) if file_size else None
+        self.read_ahead = READ_AHEAD_MIN
+        self.recent_offsets: deque[int] = deque(maxlen=8)
+        self.last_used = time.time()
+        self.readers = 0
+        self.buffered = 0  # bytes in _chunks
+
+        self._chunks: OrderedDict[int, bytes] = OrderedDict()  # LRU
+        self._expiry: asyncio.TimerHandle | None = None
+        self._downloads: list[_Download] = []
+        self._position: int | None = None  # next chunk the last reader wanted
+        self._sequential = 0  # chunks read in a row without a jump
+
+    @property
+    def is_sequential(self) -> bool:
+        """True once reads look like playback rather than probing."""
+        return self.read_ahead > READ_AHEAD_MIN
+
+    def clear_buffer(self) -> None:
+        """Drop all buffered chunks; running downloads keep going."""
+        self._chunks.clear()
+        self.buffered = 0
+
+    def attach(self) -> None:
+        """A Range request starts reading from this session."""
+        self.readers += 1
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+
+    def detach(self) -> None:
+        """A Range request is done; expire the session if nobody comes back."""
+        self.readers -= 1
+        self.last_used = time.time()
+        if self.readers == 0:
+            self.schedule_expiry()
+
+    def schedule_expiry(self) -> None:
+        if self._expiry is not None:
+            self._expiry.cancel()
+        loop = asyncio.get_running_loop()
+        self._expiry = loop.call_later(SESSION_TTL, _expire_session, self)
+
+    def open(self, byte_offset: int) -> None:
+        """Register a new HTTP request starting at byte_offset."""
+        self.recent_offsets.append(byte_offset)
+        self.last_used = time.time()
+        chunk_index = byte_offset // CHUNK_SIZE
+
+        # Player reconnecting where it left off keeps the read-ahead it built up;
+        # anything else is a seek/probe, so start shallow again
+        continuing = self._position is not None and abs(chunk_index - self._position) <= 1
+        if not continuing and chunk_index not in self._chunks:
+            self.read_ahead = READ_AHEAD_MIN
+            self._sequential = 0
+        self._position = chunk_index
+
+    async def read(self, chunk_index: int) -> bytes | None:
+        """Return one chunk (None past end of file) and keep the read-ahead window full."""
+        self.last_used = time.time()
+        if self.total_chunks is not None and chunk_index >= self.total_chunks:
+            return None
+
+        chunk = self._chunks.get(chunk_index)
+        if chunk is not None:
+            self._chunks.move_to_end(chunk_index)
+        else:
+            download = self._download_for(chunk_index)
+            future = download.waiters.get(chunk_index)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                # Nobody may be left to read it — don't warn about an unretrieved error
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                download.waiters[chunk_index] = future
+            # Several Range requests can wait on the same chunk; one of them
+            # being cancelled mustn't cancel it for the others
+            chunk = await asyncio.shield(future)
+
+        if chunk is not None:
+            self._advance(chunk_index)
+        return chunk
+
+    def _advance(self, chunk_index: int) -> None:
+        if chunk_index == self._position:
+            self._sequential += 1
+            if self._sequential >= self.read_ahead:
+                self.read_ahead = min(self.read_ahead * 2, READ_AHEAD_MAX)
+                self._sequential = 0
+        self._position = chunk_index + 1
+
+        # Let the download this reader follows move on
+        next_index = chunk_index + 1
+        if self.total_chunks is not None and next_index >= self.total_chunks:
+            return
+        for download in self._downloads:
+            if download.next - READ_AHEAD_MAX - 1 <= next_index <= download.next + self.read_ahead:
+                download.wanted = max(download.wanted, next_index)
+                download.wake.set()
+                return
+        # Playing on from buffered chunks: start fetching before the reader gets there
+        if self.is_sequential and next_index not in self._chunks:
+            self._download_for(next_index)
+
+    def _download_for(self, chunk_index: int) -> _Download:
+        """Find the download that is about to produce chunk_index, or start one there."""
+        for download in self._downloads:
+            if download.next <= chunk_index <= download.next + self.read_ahead:
+                break
+        else:
+            download = _Download(chunk_index)
+            download.task = asyncio.create_task(self._run(download))
+            self._downloads.append(download)
+
+        download.wanted = max(download.wanted, chunk_index)
+        download.wake.set()
+        return download
+
+    async def _run(self, download: _Download) -> None:
+        error: BaseException | None = None
+        try:
+            client = await get_client()
+            chunks = client.stream_media(self.message, offset=download.next)
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    self._store(download, chunk)
+
+                    # Stay at most read_ahead chunks ahead of what readers asked for
+                    while download.next > download.wanted + self.read_ahead:
+                        download.wake.clear()
+                        try:
+                            await asyncio.wait_for(download.wake.wait(), DOWNLOAD_IDLE)
+                        except asyncio.TimeoutError:
+                            return  # readers went away (probe done, player paused)
+        except Exception as e:
+            error = e
+        finally:
+            self._downloads.remove(download)
+            # Whatever wasn't delivered: either an error or end of file
+            for future in download.waiters.values():
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+
+    def _store(self, download: _Download, chunk: bytes) -> None:
+        chunk_index = download.next
+        download.next += 1
+
+        replaced = self._chunks.get(chunk_index)
+        if replaced is not None:
+            self.buffered -= len(replaced)
+        self._chunks[chunk_index] = chunk
+        self._chunks.move_to_end(chunk_index)
+        self.buffered += len(chunk)
+        while len(self._chunks) > SESSION_MAX_CHUNKS:
+            self.buffered -= len(self._chunks.popitem(last=False)[1])
+        _trim_buffers()
+
+        future = download.waiters.pop(chunk_index, None)
+        if future is not None and not future.done():
+            future.set_result(chunk)
+
+
+def _trim_buffers() -> None:
+    """Keep buffered chunks of all sessions under SESSIONS_MAX_BYTES, LRU session first."""
+    total = sum(session.buffered for session in _sessions.values())
+    if total <= SESSIONS_MAX_BYTES:
+        return
+    # Idle sessions go before ones somebody is reading from
+    for session in sorted(_sessions.values(), key=lambda s: (s.readers > 0, s.last_used)):
+        total -= session.buffered
+        session.clear_buffer()
+        if total <= SESSIONS_MAX_BYTES:
+            break
+
+
+def _expire_session(session: StreamSession) -> None:
+    """Timer callback: drop a session SESSION_TTL after its last reader left."""
+    session._expiry = None
+    if session.readers:
+        return
+    idle = time.time() - session.last_used
+    if idle < SESSION_TTL:
+        session._expiry = asyncio.get_running_loop().call_later(
+            SESSION_TTL - idle, _expire_session, session
+        )
+        return
+    session.clear_buffer()
+    if _sessions.get(session.episode_bot_id) is session:
+        del _sessions[session.episode_bot_id]
+
+
+def get_session(episode_bot_id: int, message: Message, file_size: int) -> StreamSession:
+    """Get the live session for a video or start a new one."""
+    session = _sessions.get(episode_bot_id)
+    if session is None or session.message.id != message.id:
+        if session is not None:
+            session.clear_buffer()
+        session = StreamSession(episode_bot_id, message, file_size)
+        _sessions[episode_bot_id] = session
+        # Expires even if the response never starts reading
+        session.schedule_expiry()
+    return session
+
+
 async def stream_video(
-    message: Message, byte_offset: int = 0
+    session: StreamSession, byte_offset: int = 0
 ) -> AsyncGenerator[bytes, None]:
     """
     Stream a video file from Telegram in chunks.
 
     byte_offset: byte position to start from (for HTTP Range requests).
     Pyrogram's stream_media uses chunk-based offset (1 MiB chunks),
-    so we convert and handle partial first chunk.
+    so we convert and handle partial first chunk. Only that partial chunk
+    is copied (ASGI bodies must be bytes); the rest go out as-is. Chunks come
+    from the session's buffer when a previous request already fetched them.
     """
-    client = await get_client()
-
     # Convert byte offset to chunk offset
     chunk_offset = byte_offset // CHUNK_SIZE
     skip_bytes = byte_offset % CHUNK_SIZE  # bytes to skip in first chunk
 
+    session.open(byte_offset)
     log.info(
         f"Streaming: byte_offset={byte_offset}, chunk_offset={chunk_offset}, "
-        f"skip_bytes_in_first_chunk={skip_bytes}"
+        f"skip_bytes_in_first_chunk={skip_bytes}, read_ahead={session.read_ahead}"
     )
 
     bytes_sent = 0
-    first_chunk = True
+    session.attach()
 
     try:
-        async for chunk in client.stream_media(message, offset=chunk_offset):
-            if first_chunk and skip_bytes > 0:
+        chunk_index = chunk_offset
+        while True:
+            chunk = await session.read(chunk_index)
+            if chunk is None:
+                break
+            chunk_index += 1
+
+            if skip_bytes:
                 chunk = chunk[skip_bytes:]
-                first_chunk = False
-            first_chunk = False
+                skip_bytes = 0
 
             bytes_sent += len(chunk)
             yield chunk
     except Exception as e:
         log.error(f"Stream error after {bytes_sent} bytes: {e}", exc_info=True)
     finally:
-        log.info(f"Stream done: {bytes_sent} bytes sent ({bytes_sent / 1024 / 1024:.1f} MB)")
+        session.detach()
+        log.info(
+            f"Stream done: {bytes_sent} bytes sent ({bytes_sent / 1024 / 1024:.1f} MB), "
+            f"sequential={session.is_sequential}"
+        )